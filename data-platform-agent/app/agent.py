@@ -1,12 +1,51 @@
+import os
+from functools import lru_cache
+from dotenv import load_dotenv
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.agents import AgentExecutor, create_tool_calling_agent
 from langchain_core.prompts import ChatPromptTemplate
+from langchain.globals import set_llm_cache
+from langchain_community.cache import SQLiteCache
+from sqlalchemy import text
 from app.tools import fetch_daily_data, fetch_realtime_data
-from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+class BoundedSQLiteCache(SQLiteCache):
+    """
+    SQLiteCache that only stores reusable turns and keeps at most `max_rows` rows.
+
+    Turns after a tool call embed that run's serialized AIMessage and the live tool
+    output, so their prompts never recur; writing them would only grow the file.
+    Beyond that, the oldest rows are pruned on every write.
+    """
+
+    def __init__(self, database_path: str, max_rows: int):
+        super().__init__(database_path=database_path)
+        self.max_rows = max_rows
+
+    def update(self, prompt, llm_string, return_val):
+        if '"ToolMessage"' in prompt:
+            return
+        super().update(prompt, llm_string, return_val)
+        table = self.cache_schema.__tablename__
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(f"DELETE FROM {table} WHERE rowid <= (SELECT MAX(rowid) FROM {table}) - :max_rows"),
+                {"max_rows": self.max_rows}
+            )
+
+# Persist LLM responses across restarts. Keys are the fully rendered prompt (which
+# includes the tenant_id and the user's query) plus the model settings, so entries
+# never cross tenants, and turns that embed fresh tool output never hit stale data.
+# The file at LLM_CACHE_PATH is capped at LLM_CACHE_MAX_ROWS rows (oldest pruned
+# first); deleting it simply clears the cache.
+set_llm_cache(BoundedSQLiteCache(
+    database_path=os.getenv("LLM_CACHE_PATH", ".llm_cache.db"),
+    max_rows=int(os.getenv("LLM_CACHE_MAX_ROWS", "10000"))
+))
+
 # Initialize LLM
 llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash", temperature=0)
 
@@ -26,13 +65,21 @@ prompt = ChatPromptTemplate.from_messages([
     ("placeholder", "{agent_scratchpad}"),
 ])
 
-# Create Agent
-agent = create_tool_calling_agent(llm, tools, prompt)
+@lru_cache(maxsize=256)
+def get_executor(tenant_id: str) -> AgentExecutor:
+    """
+    Returns the agent executor for a tenant.
 
-# Create Executor
-agent_executor = AgentExecutor(
-    agent=agent, 
-    tools=tools, 
-    verbose=True, 
-    return_intermediate_steps=True
-)
+    The tenant_id is bound into the prompt up front, so callers only supply the
+    user's input and a request can never run under another tenant's context.
+    """
+    agent = create_tool_calling_agent(llm, tools, prompt.partial(tenant_id=tenant_id))
+    return AgentExecutor(
+        agent=agent, 
+        tools=tools, 
+        verbose=True, 
+        return_intermediate_steps=True,
+        # Plan with ainvoke rather than astream: only the invoke path consults the
+        # LLM cache. astream_events still receives token events from the model.
+        stream_runnable=False
+    )
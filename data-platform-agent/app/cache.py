@@ -0,0 +1,206 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Iterable, List, Optional, Tuple
+
+import faiss
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from app.schemas import ChatResponse
+from app.tools import TOOL_ERROR_PREFIXES, is_closed_range
+
+# Cosine similarity above which two queries are treated as the same question
+SIMILARITY_THRESHOLD = 0.92
+
+# Seconds a cached answer stays valid, keyed by the tools that produced it (the
+# shortest lifetime among them wins). Intraday prices move, so realtime answers
+# must expire quickly; historical EOD data is immutable once the day has closed.
+TTL_BY_TOOL = {
+    "fetch_realtime_data": 30,
+    "fetch_daily_data": 24 * 60 * 60,
+}
+DEFAULT_TTL = 5 * 60
+
+# Number of neighbours inspected per lookup so expired entries don't hide fresh ones
+SEARCH_K = 4
+
+# tenant_id comes from the client, so both the number of tenants and the entries
+# per tenant are bounded. Least recently used tenants and oldest entries go first.
+MAX_TENANTS = 256
+MAX_ENTRIES_PER_TENANT = 1000
+
+# Queries that differ only in which data they ask for ("IBM on 2025-01-03" vs
+# "IBM on 2025-01-06", "Jan 2025" vs "Feb 2025") embed almost identically, so a
+# hit also requires these extracted values to match exactly.
+_RE_NUMBER = re.compile(r"\d+(?:[.:/-]\d+)*")
+# Upper-case symbols ("IBM") or cashtags in any case ("$tsla")
+_RE_TICKER = re.compile(r"\$([A-Za-z]{1,5})\b|\b([A-Z]{1,5})\b")
+_RE_PERIOD = re.compile(
+    r"\b(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?|sept?(?:ember)?"
+    r"|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?|today|yesterday|tomorrow|week|month|quarter|year|ytd)\b",
+    re.IGNORECASE,
+)
+_MONTHS = {"jan", "feb", "mar", "apr", "may", "jun", "jul", "aug", "sep", "oct", "nov", "dec"}
+
+
+def query_key(query: str) -> Tuple[str, ...]:
+    """Returns the tickers, numbers/dates and calendar periods mentioned in a query."""
+    values = set(_RE_NUMBER.findall(query))
+    values.update((cashtag or symbol).upper() for cashtag, symbol in _RE_TICKER.findall(query))
+    for period in _RE_PERIOD.findall(query):
+        # Months are normalized to their 3-letter form so "Jan" and "January" agree
+        period = period.lower()
+        values.add(period[:3] if period[:3] in _MONTHS else period)
+    return tuple(sorted(values))
+
+
+def is_cacheable(response: ChatResponse, observations: Iterable[object] = ()) -> bool:
+    """
+    Returns False for answers that must not be replayed: empty answers, or answers
+    built on a tool call that failed or found no data (tools report these as strings).
+    """
+    if not response.answer.strip():
+        return False
+    for observation in observations:
+        text = str(observation).strip()
+        if not text or text in ("[]", "{}") or text.startswith(TOOL_ERROR_PREFIXES):
+            return False
+    return True
+
+
+def cache_ttl(tool_calls: Iterable[Tuple[str, Any]]) -> float:
+    """
+    Returns how long an answer built from these (tool name, args) calls may be reused.
+
+    An answer is only as fresh as its most volatile input, so this is the minimum
+    across every call. A daily range that reaches today can still change, so it
+    gets the default lifetime rather than the daily one.
+    """
+    ttls = []
+    for name, args in tool_calls:
+        ttl = TTL_BY_TOOL.get(name, DEFAULT_TTL)
+        if name == "fetch_daily_data":
+            end_date = args.get("end_date", "") if isinstance(args, dict) else ""
+            if not is_closed_range(str(end_date)):
+                ttl = min(ttl, DEFAULT_TTL)
+        ttls.append(ttl)
+    return min(ttls, default=DEFAULT_TTL)
+
+
+class _TenantCache:
+    """One tenant's FAISS index plus its sidecar entries, oldest first."""
+
+    def __init__(self, dim: int):
+        # IDMap2 so individual vectors can be evicted by id
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        # id -> (query key, response, expires_at)
+        self.entries: "OrderedDict[int, Tuple[Tuple[str, ...], ChatResponse, float]]" = OrderedDict()
+
+    def remove(self, ids: List[int]) -> None:
+        for entry_id in ids:
+            del self.entries[entry_id]
+        self.index.remove_ids(np.array(ids, dtype="int64"))
+
+
+class SemanticCache:
+    """
+    Per-tenant semantic cache of agent responses.
+
+    Queries are embedded with a local MiniLM model and matched by cosine similarity
+    (inner product over normalized vectors) against a FAISS index owned by the tenant,
+    so answers never leak across tenants.
+
+    All methods block (model load, encoding, index search), so async callers should
+    run them in a worker thread. Index and sidecar mutation is guarded by a lock.
+    """
+
+    def __init__(self, model_name: str = "all-MiniLM-L6-v2", threshold: float = SIMILARITY_THRESHOLD):
+        self.model_name = model_name
+        self.threshold = threshold
+        self._model: Optional[SentenceTransformer] = None
+        self._tenants: "OrderedDict[str, _TenantCache]" = OrderedDict()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+    def load_model(self) -> SentenceTransformer:
+        """Loads the embedding model once; called at startup so requests don't pay for it."""
+        with self._lock:
+            if self._model is None:
+                self._model = SentenceTransformer(self.model_name)
+            return self._model
+
+    def _embed(self, query: str):
+        return self.load_model().encode([query], normalize_embeddings=True).astype("float32")
+
+    def _search(self, tenant: _TenantCache, vector) -> List[int]:
+        if tenant.index.ntotal == 0:
+            return []
+        scores, ids = tenant.index.search(vector, min(SEARCH_K, tenant.index.ntotal))
+        return [int(i) for i, s in zip(ids[0], scores[0]) if i != -1 and s >= self.threshold]
+
+    def lookup(self, tenant_id: str, query: str) -> Optional[ChatResponse]:
+        """Returns a cached response for a semantically equivalent query, if still fresh."""
+        key = query_key(query)
+        vector = self._embed(query)
+        now = time.monotonic()
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            if tenant is None:
+                return None
+            self._tenants.move_to_end(tenant_id)
+            for entry_id in self._search(tenant, vector):
+                entry_key, response, expires_at = tenant.entries[entry_id]
+                if entry_key == key and expires_at > now:
+                    return response
+        return None
+
+    def store(
+        self,
+        tenant_id: str,
+        query: str,
+        response: ChatResponse,
+        observations: Iterable[object] = (),
+        tool_calls: Iterable[Tuple[str, Any]] = ()
+    ) -> None:
+        """
+        Caches a response, with a lifetime chosen by the tools that produced it.
+
+        `observations` are the raw tool outputs behind the answer; failed or empty
+        lookups are not cached (see is_cacheable). `tool_calls` are every
+        (tool name, args) pair the agent invoked (see cache_ttl).
+        """
+        if not is_cacheable(response, observations):
+            return
+
+        key = query_key(query)
+        vector = self._embed(query)
+        now = time.monotonic()
+        expires_at = now + cache_ttl(tool_calls)
+
+        with self._lock:
+            tenant = self._tenants.get(tenant_id)
+            if tenant is None:
+                if len(self._tenants) >= MAX_TENANTS:
+                    self._tenants.popitem(last=False)
+                tenant = self._tenants[tenant_id] = _TenantCache(vector.shape[1])
+            self._tenants.move_to_end(tenant_id)
+
+            # An equivalent entry is replaced rather than duplicated
+            duplicates = [i for i in self._search(tenant, vector) if tenant.entries[i][0] == key]
+            if duplicates:
+                tenant.remove(duplicates)
+
+            if len(tenant.entries) >= MAX_ENTRIES_PER_TENANT:
+                # Drop expired entries first, then the oldest ones
+                expired = [i for i, (_, _, exp) in tenant.entries.items() if exp <= now]
+                tenant.remove(expired or [next(iter(tenant.entries))])
+
+            entry_id = self._next_id
+            self._next_id += 1
+            tenant.index.add_with_ids(vector, np.array([entry_id], dtype="int64"))
+            tenant.entries[entry_id] = (key, response, expires_at)
+
+
+semantic_cache = SemanticCache()
@@ -1,18 +1,33 @@
+import asyncio
+import json
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
 from app.schemas import ChatRequest, ChatResponse
-from app.agent import agent_executor
+from app.agent import get_executor
+from app.cache import semantic_cache
+from app.tools import close_http_client
 
 app = FastAPI(title="Data Platform Agent")
 
+@app.on_event("startup")
+async def startup():
+    # Load the embedding model up front, off the event loop
+    await asyncio.to_thread(semantic_cache.load_model)
+
+@app.on_event("shutdown")
+async def shutdown():
+    await close_http_client()
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat_endpoint(request: ChatRequest):
     try:
-        # Pass tenant_id and input (query) to the agent
-        # The prompt template expects 'input' and we want to make 'tenant_id' available for the agent to use
-        result = await agent_executor.ainvoke({
-            "input": request.query,
-            "tenant_id": request.tenant_id
-        })
+        # Serve semantically equivalent queries from the tenant's cache without invoking the LLM
+        cached = await asyncio.to_thread(semantic_cache.lookup, request.tenant_id, request.query)
+        if cached is not None:
+            return cached
+
+        # The tenant's executor already has tenant_id bound into its prompt
+        result = await get_executor(request.tenant_id).ainvoke({"input": request.query})
         
         # Extract the answer
         answer = result.get("output", "")
@@ -23,17 +38,85 @@ async def chat_endpoint(request: ChatRequest):
         if intermediate_steps:
             # Get the name of the tool from the first action
             tool_used = intermediate_steps[0][0].tool
-        elif "fetch_realtime_data" in str(result):
-            # Fallback for older LangChain results or direct strings
-            tool_used = "fetch_realtime_data"
-        elif "fetch_daily_data" in str(result):
-            tool_used = "fetch_daily_data"
         
-        return ChatResponse(answer=answer, tool_used=tool_used)
+        response = ChatResponse(answer=answer, tool_used=tool_used)
+        observations = [observation for _, observation in intermediate_steps]
+        tool_calls = [(action.tool, action.tool_input) for action, _ in intermediate_steps]
+        try:
+            await asyncio.to_thread(
+                semantic_cache.store, request.tenant_id, request.query, response, observations, tool_calls
+            )
+        except Exception as e:
+            # The answer is already computed; a cache failure only costs a future hit
+            print(f"DEBUG: semantic cache store failed: {str(e)}")
+        return response
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _stream_chat(request: ChatRequest):
+    """
+    Yields the agent's answer as newline-delimited JSON.
+
+    Lines are {"token": ...} carrying answer text as it is generated, {"reset": true}
+    when text streamed so far was preamble to a tool call and should be discarded, and
+    a single trailing {"tool_used": ..., "answer": ...} sentinel whose answer is the
+    agent's final output (the same value /api/chat returns). Failures after the
+    stream has started are reported as a final {"error": ...} line instead.
+    """
+    tool_used = None
+    tool_calls = []
+    observations = []
+    answer = None
+    try:
+        cached = await asyncio.to_thread(semantic_cache.lookup, request.tenant_id, request.query)
+        if cached is not None:
+            yield json.dumps({"token": cached.answer}) + "\n"
+            yield json.dumps({"tool_used": cached.tool_used, "answer": cached.answer}) + "\n"
+            return
+
+        executor = get_executor(request.tenant_id)
+        async for event in executor.astream_events({"input": request.query}, version="v2"):
+            kind = event["event"]
+            if kind == "on_chat_model_stream":
+                chunk = event["data"]["chunk"]
+                # Tool-call arguments are not answer text
+                if chunk.content and isinstance(chunk.content, str) and not chunk.tool_call_chunks:
+                    yield json.dumps({"token": chunk.content}) + "\n"
+            elif kind == "on_chat_model_end":
+                # Any text from a turn that ended in a tool call was preamble, not the answer
+                if getattr(event["data"].get("output"), "tool_calls", None):
+                    yield json.dumps({"reset": True}) + "\n"
+            elif kind == "on_tool_start":
+                tool_calls.append((event["name"], event["data"].get("input")))
+                # Report the first tool invoked, matching the non-streaming endpoint
+                if tool_used is None:
+                    tool_used = event["name"]
+            elif kind == "on_tool_end":
+                output = event["data"].get("output")
+                observations.append(getattr(output, "content", output))
+            elif kind == "on_chain_end" and not event["parent_ids"]:
+                # The executor's own result carries the final answer
+                answer = event["data"]["output"].get("output", "")
+    except Exception as e:
+        yield json.dumps({"error": str(e)}) + "\n"
+        return
+
+    response = ChatResponse(answer=answer or "", tool_used=tool_used)
+    yield json.dumps({"tool_used": tool_used, "answer": response.answer}) + "\n"
+
+    try:
+        await asyncio.to_thread(
+            semantic_cache.store, request.tenant_id, request.query, response, observations, tool_calls
+        )
+    except Exception as e:
+        # The answer has already been delivered; a cache failure only costs a future hit
+        print(f"DEBUG: semantic cache store failed: {str(e)}")
+
+@app.post("/api/chat/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    return StreamingResponse(_stream_chat(request), media_type="application/x-ndjson")
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
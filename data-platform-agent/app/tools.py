@@ -1,13 +1,76 @@
+import asyncio
 import os
-import requests
+import httpx
 from langchain.tools import tool
-import json
+import orjson
+from itertools import islice
+from datetime import date
+from cachetools import LRUCache, TTLCache
 from dotenv import load_dotenv
 
+# Load .env here too (it is idempotent) so the key below doesn't depend on import order
 load_dotenv()
 
+# Read once at import
+_AV_KEY = os.getenv("ALPHA_VANTAGE_API_KEY", "demo")
+_AV_URL_TMPL = "https://www.alphavantage.co/query?function=TIME_SERIES_INTRADAY&symbol={t}&interval={i}&apikey=" + _AV_KEY
+
+# Tools report failures to the agent as strings starting with one of these,
+# so callers can tell them apart from data (e.g. to avoid caching them)
+TOOL_ERROR_PREFIXES = ("Error fetching", "Could not find")
+
+# Shared client so connections (and TLS sessions) are pooled across tool calls.
+# Closed by the FastAPI shutdown hook in main.py.
+_client = httpx.AsyncClient(timeout=30, limits=httpx.Limits(max_keepalive_connections=32))
+
+async def close_http_client() -> None:
+    """Releases the pooled connections held by the shared HTTP client."""
+    await _client.aclose()
+
+# Historical EOD data is immutable once the day has closed and been ingested, so
+# non-empty daily responses for ranges ending before today are cached indefinitely
+# (bounded LRU). See _fetch_daily_impl.
+_daily_cache = LRUCache(maxsize=4096)
+
+# Intraday ticks change, so realtime results are only reused for a short window
+_realtime_cache = TTLCache(maxsize=512, ttl=30)
+
+# Bounds concurrent Alpha Vantage calls so bursts of agent requests don't trip its rate limit.
+# Cache hits are served before acquiring it.
+_av_sem = asyncio.Semaphore(5)
+
+def is_closed_range(end_date: str) -> bool:
+    """True if a daily range ending on `end_date` only covers days that have already closed."""
+    try:
+        return date.fromisoformat(end_date) < date.today()
+    except ValueError:
+        return False
+
+async def _fetch_daily_impl(ticker: str, start_date: str, end_date: str, tenant_id: str) -> str:
+    # Errors raise and are never cached
+    cache_key = (ticker, start_date, end_date, tenant_id)
+    if cache_key in _daily_cache:
+        return _daily_cache[cache_key]
+
+    url = f"http://localhost:8082/api/query/{tenant_id}/DAILY"
+    payload = {
+        "instrument_id": ticker,
+        "start_date": start_date,
+        "end_date": end_date
+    }
+
+    response = await _client.post(url, json=payload)
+    response.raise_for_status()
+    data = orjson.loads(response.content)
+    result = orjson.dumps(data).decode()
+    # An empty result may just mean the data hasn't been ingested yet, and a range
+    # reaching today can still change, so neither is safe to keep
+    if data and is_closed_range(end_date):
+        _daily_cache[cache_key] = result
+    return result
+
 @tool
-def fetch_daily_data(ticker: str, start_date: str, end_date: str, tenant_id: str = "DEFAULT") -> str:
+async def fetch_daily_data(ticker: str, start_date: str, end_date: str, tenant_id: str = "DEFAULT") -> str:
     """
     Fetches daily pricing data for a given ticker and date range.
     
@@ -23,22 +86,13 @@ def fetch_daily_data(ticker: str, start_date: str, end_date: str, tenant_id: str
     """
     print(f"DEBUG: fetch_daily_data called with ticker={ticker}, start={start_date}, end={end_date}, tenant={tenant_id}")
     
-    url = f"http://localhost:8082/api/query/{tenant_id}/DAILY"
-    payload = {
-        "instrument_id": ticker,
-        "start_date": start_date,
-        "end_date": end_date
-    }
-    
     try:
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-        return json.dumps(response.json())
-    except requests.exceptions.RequestException as e:
+        return await _fetch_daily_impl(ticker, start_date, end_date, tenant_id)
+    except (httpx.HTTPError, ValueError) as e:
         return f"Error fetching daily data: {str(e)}"
 
 @tool
-def fetch_realtime_data(ticker: str, interval: str = "5min") -> str:
+async def fetch_realtime_data(ticker: str, interval: str = "5min") -> str:
     """
     Fetches real-time (intraday) pricing data for a given ticker using Alpha Vantage.
     
@@ -52,13 +106,20 @@ def fetch_realtime_data(ticker: str, interval: str = "5min") -> str:
     """
     print(f"DEBUG: fetch_realtime_data called for {ticker} at {interval} intervals")
     
-    api_key = os.getenv("ALPHA_VANTAGE_API_KEY", "demo")
-    url = f"https://www.alphavantage.co/query?function=TIME_SERIES_INTRADAY&symbol={ticker}&interval={interval}&apikey={api_key}"
+    cache_key = (ticker, interval)
+    if cache_key in _realtime_cache:
+        return _realtime_cache[cache_key]
+
+    url = _AV_URL_TMPL.format(t=ticker, i=interval)
     
     try:
-        response = requests.get(url)
+        async with _av_sem:
+            # Another request may have fetched this ticker while we waited
+            if cache_key in _realtime_cache:
+                return _realtime_cache[cache_key]
+            response = await _client.get(url)
         response.raise_for_status()
-        data = response.json()
+        data = orjson.loads(response.content)
         
         # Alpha Vantage returns data in "Time Series (Xmin)" key
         time_series_key = f"Time Series ({interval})"
@@ -67,14 +128,16 @@ def fetch_realtime_data(ticker: str, interval: str = "5min") -> str:
         
         # Take the most recent 10 data points for brevity
         series = data[time_series_key]
-        recent_points = list(series.items())[:10]
+        recent_points = list(islice(series.items(), 10))
         
         formatted_results = [f"Real-time data for {ticker} ({interval} intervals):"]
         for timestamp, values in recent_points:
             price = values["4. close"]
             formatted_results.append(f"{timestamp}: ${price}")
             
-        return "\n".join(formatted_results)
+        result = "\n".join(formatted_results)
+        _realtime_cache[cache_key] = result
+        return result
         
     except Exception as e:
         return f"Error fetching real-time data: {str(e)}"
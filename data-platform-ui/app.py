@@ -1,9 +1,9 @@
 import streamlit as st
-import requests
+import httpx
 import json
-import pandas as pd
 import plotly.express as px
 import re
+import time
 
 # 1. Configuration & Layout
 st.set_page_config(
@@ -94,42 +94,171 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # 2. Helper Functions
+# Price pattern, compiled once since Streamlit re-executes this script on every rerun.
+# A single alternation so each text is scanned once:
+#   d1/p1: Date/Time followed by Price (optional $). Supports YYYY-MM-DD and YYYY-MM-DD HH:MM:SS
+#   p2/d2: Price (optional $) followed by "on/for/at/as of" and Date/Time
+_RE_PRICE = re.compile(
+    r"(?:(?P<d1>\d{4}-\d{2}-\d{2}(?:\s\d{2}:\d{2}:\d{2})?)[:\s]+(?:\$)?(?P<p1>\d+\.?\d*))"
+    r"|(?:(?:\$)?(?P<p2>\d+\.?\d*)\s+(?:on|for|at|as of)\s+(?P<d2>\d{4}-\d{2}-\d{2}(?:\s\d{2}:\d{2}:\d{2})?))"
+)
+# Every price match contains a date, so texts without one can be rejected cheaply
+_RE_QUICK = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+# The parse and chart caches are process-wide and shared by every session, so they
+# are bounded; evicted entries are simply rebuilt from the message content.
+CHART_CACHE_MAX_ENTRIES = 512
+CHART_CACHE_TTL = "1h"
+
+@st.cache_data(max_entries=CHART_CACHE_MAX_ENTRIES, ttl=CHART_CACHE_TTL)
+def parse_message_metrics(content):
+    """
+    Extracts the price series from a message and computes its summary metrics.
+
+    Cached on the message content, which never changes once saved, so reruns only
+    pay for parsing new messages. Returns ((dates, prices), latest, prev, high) with
+    the series sorted by date, or None if the content has no price data.
+    """
+    # Most answers are plain text; skip the full pattern when there is no date at all
+    if not _RE_QUICK.search(content):
+        return None
+
+    # One scan collects both orderings. Date-then-price (the listed points) takes
+    # precedence; price-then-date is only a fallback, since answers that list points
+    # often restate one in a summary ("The high was 152.00 on 2025-01-03").
+    listed, phrased = {}, {}
+    for m in _RE_PRICE.finditer(content):
+        if m["d1"]:
+            listed.setdefault(m["d1"], m["p1"])
+        else:
+            phrased.setdefault(m["d2"], m["p2"])
+    # One point per date, keeping the first mention
+    matches = list((listed or phrased).items())
+
+    print(f"DEBUG - Text to parse: {content}")
+    print(f"DEBUG - Matches found: {matches}")
+
+    if not matches:
+        return None
+
+    # Answers carry a handful of points, so plain lists beat a DataFrame round-trip
+    pairs = sorted(matches, key=lambda x: x[0])
+    dates = [p[0] for p in pairs]
+    prices = [float(p[1]) for p in pairs]
+
+    return (dates, prices), prices[-1], prices[0], max(prices)
+
+# cache_resource rather than cache_data: cache_data would pickle a deep copy of the
+# Figure on every call, costing about as much as rebuilding it. The cached figure is
+# shared across reruns and sessions, so callers must not mutate it.
+@st.cache_resource(max_entries=CHART_CACHE_MAX_ENTRIES, ttl=CHART_CACHE_TTL)
 def parse_and_plot(text):
     """Detects price data in text and returns a plotly chart if found."""
-    # Pattern 1: Date/Time followed by Price (optional $)
-    # Supports YYYY-MM-DD and YYYY-MM-DD HH:MM:SS
-    matches = re.findall(r"(\d{4}-\d{2}-\d{2}(?:\s\d{2}:\d{2}:\d{2})?)[:\s]+(?:\$)?(\d+\.?\d*)", text)
-    
-    # Pattern 2: Price (optional $) followed by "on/for/at/as of" and Date/Time
-    if not matches:
-        conv_matches = re.findall(r"(?:\$)?(\d+\.?\d*)\s+(?:on|for|at|as of)\s+(\d{4}-\d{2}-\d{2}(?:\s\d{2}:\d{2}:\d{2})?)", text)
-        if conv_matches:
-            matches = [(d, p) for p, d in conv_matches]
+    parsed = parse_message_metrics(text)
+    if parsed is None:
+        return None
 
-    print(f"DEBUG - Text to parse: {text}")
-    print(f"DEBUG - Matches found: {matches}")
+    dates, prices = parsed[0]
+    fig = px.line(
+        x=dates, y=prices,
+        labels={"x": "Date", "y": "Price"},
+        markers=True,
+        template="plotly_dark",
+        title="Equity Performance"
+    )
+    fig.update_traces(line_color='#e94560', marker=dict(size=8, color='#e94560'))
+    fig.update_layout(
+        plot_bgcolor='rgba(0,0,0,0)',
+        paper_bgcolor='rgba(0,0,0,0)',
+        font_family="Outfit",
+        xaxis=dict(showgrid=False),
+        yaxis=dict(showgrid=True, gridcolor='rgba(255,255,255,0.05)')
+    )
+    return fig
 
-    if matches:
-        df = pd.DataFrame(matches, columns=["Date", "Price"])
-        df["Price"] = pd.to_numeric(df["Price"])
-        df = df.sort_values("Date")
-        
-        fig = px.line(
-            df, x="Date", y="Price", 
-            markers=True,
-            template="plotly_dark",
-            title="Equity Performance"
-        )
-        fig.update_traces(line_color='#e94560', marker=dict(size=8, color='#e94560'))
-        fig.update_layout(
-            plot_bgcolor='rgba(0,0,0,0)',
-            paper_bgcolor='rgba(0,0,0,0)',
-            font_family="Outfit",
-            xaxis=dict(showgrid=False),
-            yaxis=dict(showgrid=True, gridcolor='rgba(255,255,255,0.05)')
-        )
-        return fig
-    return None
+def render_chart_and_metrics(content):
+    """
+    Renders the price metrics and chart for a message, if it contains price data.
+
+    Shared by the chat history and the live response; both the parse and the figure
+    come from the content-keyed caches. Returns True if anything was rendered.
+    """
+    parsed = parse_message_metrics(content)
+    if parsed is None:
+        return False
+
+    _, latest, prev, high = parsed
+    m1, m2 = st.columns(2)
+    m1.metric("Latest Price", f"${latest:.2f}", f"{latest-prev:+.2f}")
+    m2.metric("High", f"${high:.2f}")
+
+    st.plotly_chart(parse_and_plot(content), width='stretch')
+    return True
+
+def stream_agent_answer(query, tenant_id, trace):
+    """
+    Yields answer tokens from the agent's streaming endpoint.
+
+    Yields None when the agent retracts the text streamed so far (preamble to a
+    tool call). The trailing sentinel is recorded in `trace` rather than yielded:
+    `tool_used` for the trace log and `answer`, the agent's final output. A stream
+    that ends without the sentinel was cut off and raises.
+    """
+    with httpx.stream(
+        "POST",
+        "http://localhost:8000/api/chat/stream",
+        json={"query": query, "tenant_id": tenant_id},
+        timeout=60
+    ) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if not line:
+                continue
+            chunk = json.loads(line)
+            if "token" in chunk:
+                yield chunk["token"]
+            elif "reset" in chunk:
+                yield None
+            elif "error" in chunk:
+                raise RuntimeError(chunk["error"])
+            else:
+                trace["tool_used"] = chunk.get("tool_used")
+                trace["answer"] = chunk.get("answer", "")
+                return
+
+    raise RuntimeError("Agent stream ended before the answer was complete")
+
+# Each placeholder update is a websocket message and a frontend re-render, so
+# streamed text is flushed at most every 50ms and only once 8+ new chars are buffered
+STREAM_FLUSH_INTERVAL = 0.05
+STREAM_FLUSH_MIN_CHARS = 8
+
+def render_stream(placeholder, tokens):
+    """
+    Renders streamed tokens into a placeholder at a throttled rate; returns the full text.
+
+    A None token discards the text rendered so far.
+    """
+    text = ""
+    pending = 0
+    last_flush = time.monotonic()
+    for token in tokens:
+        if token is None:
+            text = ""
+            pending = 0
+            placeholder.empty()
+            continue
+        text += token
+        pending += len(token)
+        now = time.monotonic()
+        if pending >= STREAM_FLUSH_MIN_CHARS and now - last_flush >= STREAM_FLUSH_INTERVAL:
+            placeholder.markdown(text)
+            pending = 0
+            last_flush = now
+
+    # Always flush the tail so the final answer is complete
+    placeholder.markdown(text)
+    return text
 
 # 3. Main UI Header
 col1, col2 = st.columns([1, 10])
@@ -139,9 +268,11 @@ with col2:
     st.title("Pulsar | Financial AI")
 
 # Sidebar
-with st.sidebar:
+# Runs as a fragment so editing the tenant only reruns the sidebar, not the chat history
+@st.fragment
+def render_sidebar():
     st.markdown("### 🛠️ Configuration")
-    tenant_id = st.text_input("Tenant ID", value="IBM")
+    st.text_input("Tenant ID", value="IBM", key="tenant_id")
     st.divider()
     
     if st.button("🗑️ Clear Context"):
@@ -154,12 +285,18 @@ with st.sidebar:
     st.success("Agent Core: Active")
     st.info("Tenant Context: Registered")
 
+with st.sidebar:
+    render_sidebar()
+
 # 4. State Management
 if "messages" not in st.session_state:
     st.session_state.messages = []
 
 # 5. Rendering Chat History
-for message in st.session_state.messages:
+# Only the most recent messages are rendered by default to keep the page size bounded
+HISTORY_WINDOW = 20
+
+def render_message(message):
     with st.chat_message(message["role"]):
         if message.get("tool_used"):
             with st.expander("🔍 Trace Log"):
@@ -167,23 +304,25 @@ for message in st.session_state.messages:
         
         st.markdown(message["content"])
         
-        # Re-render plot if saved
-        if message.get("chart_data"):
-             # Re-parse for metrics persistence
-             ticks = re.findall(r"(\d{4}-\d{2}-\d{2}(?:\s\d{2}:\d{2}:\d{2})?)[:\s]+(?:\$)?(\d+\.?\d*)", message["content"]) or \
-                     [(d, p) for p, d in re.findall(r"(?:\$)?(\d+\.?\d*)\s+(?:on|for|at)\s+(\d{4}-\d{2}-\d{2}(?:\s\d{2}:\d{2}:\d{2})?)", message["content"])]
-             
-             df_hist = pd.DataFrame(ticks, columns=["Date", "Price"])
-             if not df_hist.empty:
-                df_hist["Price"] = pd.to_numeric(df_hist["Price"])
-                df_hist = df_hist.sort_values("Date")
-                latest = df_hist.iloc[-1]["Price"]
-                prev = df_hist.iloc[0]["Price"] if len(df_hist) > 1 else latest
-                m1, m2 = st.columns(2)
-                m1.metric("Latest Price", f"${latest:.2f}", f"{latest-prev:+.2f}")
-                m2.metric("High", f"${df_hist['Price'].max():.2f}")
-
-             st.plotly_chart(message["chart_data"], width='stretch')
+        # Re-render plot if the message was chartable; the figure is rebuilt from
+        # the cached parse of the content rather than kept in session state
+        if message.get("has_chart"):
+            render_chart_and_metrics(message["content"])
+
+@st.fragment
+def render_history():
+    older = st.session_state.messages[:-HISTORY_WINDOW]
+    recent = st.session_state.messages[-HISTORY_WINDOW:]
+
+    # Older messages are not sent to the browser at all unless explicitly requested
+    if older and st.toggle(f"Show older messages ({len(older)})", key="show_older_messages"):
+        for message in older:
+            render_message(message)
+
+    for message in recent:
+        render_message(message)
+
+render_history()
 
 # 6. Interaction Logic
 if query := st.chat_input("Analyze market data (e.g., Show me IBM stock performance for Jan 2025)"):
@@ -191,61 +330,41 @@ if query := st.chat_input("Analyze market data (e.g., Show me IBM stock performa
     st.session_state.messages.append({"role": "user", "content": query})
 
     with st.chat_message("assistant"):
-        answer = ""
-        tool_used = None
-        
-        with st.status("Analyzing Financial Microstructures...", expanded=True) as status:
-            try:
-                # API Call to Agent Service
-                response = requests.post(
-                    "http://localhost:8000/api/chat",
-                    json={"query": query, "tenant_id": tenant_id},
-                    timeout=60
-                )
-                response.raise_for_status()
-                data = response.json()
-                
-                answer = data.get("answer", "Analysis complete.")
-                tool_used = data.get("tool_used")
-                
-                status.update(label="Analysis Finalized", state="complete", expanded=False)
-            except Exception as e:
-                status.update(label="Analysis Interrupted", state="error")
-                st.error(f"Engine Failure: {str(e)}")
-                st.stop() # Exit early on error
-
-        # --- RENDER RESULTS OUTSIDE STATUS ---
-        if tool_used:
-            with st.expander("🔍 Trace Log"):
-                st.code(f"EXECUTE: {tool_used}", language="bash")
+        trace = {}
+        status = st.status("Analyzing Financial Microstructures...", expanded=False)
+        # Reserved above the answer so the trace log keeps its usual position
+        trace_slot = st.empty()
+
+        answer_slot = st.empty()
+
+        try:
+            # Stream the answer from the Agent Service as it is generated
+            streamed = render_stream(answer_slot, stream_agent_answer(query, st.session_state.tenant_id, trace))
+            status.update(label="Analysis Finalized", state="complete", expanded=False)
+        except Exception as e:
+            status.update(label="Analysis Interrupted", state="error")
+            st.error(f"Engine Failure: {str(e)}")
+            st.stop() # Exit early on error
 
-        st.markdown(answer)
+        # The sentinel's answer is authoritative (e.g. when the agent's LLM cache
+        # answered a turn without streaming it)
+        answer = trace["answer"]
+        if answer != streamed:
+            answer_slot.markdown(answer)
+
+        tool_used = trace.get("tool_used")
+        if tool_used:
+            with trace_slot.container():
+                with st.expander("🔍 Trace Log"):
+                    st.code(f"EXECUTE: {tool_used}", language="bash")
         
         # Check for chartable data
-        fig = parse_and_plot(answer)
-        if fig:
-            # Re-parse for metrics (could optimize but keeping it simple)
-            ticks = re.findall(r"(\d{4}-\d{2}-\d{2}(?:\s\d{2}:\d{2}:\d{2})?)[:\s]+(?:\$)?(\d+\.?\d*)", answer) or \
-                    [(d, p) for p, d in re.findall(r"(?:\$)?(\d+\.?\d*)\s+(?:on|for|at)\s+(\d{4}-\d{2}-\d{2}(?:\s\d{2}:\d{2}:\d{2})?)", answer)]
-            
-            df_plot = pd.DataFrame(ticks, columns=["Date", "Price"])
-            df_plot["Price"] = pd.to_numeric(df_plot["Price"])
-            df_plot = df_plot.sort_values("Date")
-            
-            latest_price = df_plot.iloc[-1]["Price"]
-            prev_price = df_plot.iloc[0]["Price"] if len(df_plot) > 1 else latest_price
-            delta = latest_price - prev_price
-            
-            m1, m2 = st.columns(2)
-            m1.metric("Latest Price", f"${latest_price:.2f}", f"{delta:+.2f}")
-            m2.metric("High", f"${df_plot['Price'].max():.2f}")
-            
-            st.plotly_chart(fig, width='stretch')
+        has_chart = render_chart_and_metrics(answer)
         
         # Save to session state
         st.session_state.messages.append({
             "role": "assistant", 
             "content": answer, 
             "tool_used": tool_used,
-            "chart_data": fig
+            "has_chart": has_chart
         })
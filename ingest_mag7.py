@@ -1,4 +1,5 @@
-import requests
+import asyncio
+import httpx
 import json
 from datetime import datetime, timedelta
 
@@ -15,9 +16,7 @@ mag7 = {
 
 base_url = "http://localhost:8081/api/ingest/batch"
 
-def ingest_ticker_data(ticker, base_price):
-    print(f"Ingesting data for {ticker}...")
-    
+def build_ticker_payload(ticker, base_price):
     # Ingest 7 days of data for Jan 2025
     data_points = []
     for i in range(7):
@@ -36,14 +35,20 @@ def ingest_ticker_data(ticker, base_price):
         }
         data_points.append(point)
     
-    payload = {
+    # The batch endpoint resolves one tenant config per request from "tenantId",
+    # and each ticker is its own tenant, so tickers can't share a single payload
+    return {
         "tenantId": ticker,
         "periodicity": "DAILY",
         "data": data_points
     }
+
+async def ingest_ticker_data(client, ticker, base_price):
+    print(f"Ingesting data for {ticker}...")
+    payload = build_ticker_payload(ticker, base_price)
     
     try:
-        response = requests.post(base_url, json=payload)
+        response = await client.post(base_url, json=payload)
         if response.status_code == 200:
             print(f"Successfully ingested data for {ticker}")
         else:
@@ -51,6 +56,10 @@ def ingest_ticker_data(ticker, base_price):
     except Exception as e:
         print(f"Error ingesting for {ticker}: {str(e)}")
 
+async def main():
+    # Tickers are independent, so ingest them concurrently over one pooled client
+    async with httpx.AsyncClient(timeout=60) as client:
+        await asyncio.gather(*(ingest_ticker_data(client, ticker, price) for ticker, price in mag7.items()))
+
 if __name__ == "__main__":
-    for ticker, price in mag7.items():
-        ingest_ticker_data(ticker, price)
+    asyncio.run(main())